@@ -8,6 +8,8 @@ from projeto_chatbot2 import (
     load_data,
     initialize_retriever,
     initialize_gemini_chat,
+    ChatResources,
+    is_error_response,
     get_bot_response # Importa a função que gera a resposta
 )
 
@@ -57,45 +59,44 @@ def load_config():
 
     return api_key
 
-@st.cache_data(show_spinner="Carregando Base de Dados CSV...")
-def get_cached_documents():
-    """Carrega os documentos usando a função do projeto_chatbot2.py e aplica cache."""
+@st.cache_resource(show_spinner="Carregando Recursos do Chatbot...")
+def get_resources(_api_key):
+    """
+    Carrega a base CSV, o retriever e o chat Gemini usando as funções do projeto_chatbot2.py.
+
+    Os recursos são agrupados em um único ChatResources, de modo que cada re-execução
+    do script faça apenas uma consulta ao cache do Streamlit, em vez de uma por recurso.
+    cache_resource (e não cache_data): os recursos são somente leitura,
+    então não precisam ser serializados (pickle) a cada acesso.
+    """
     try:
-        return load_data()
+        documents = load_data()
     except Exception as e:
         st.error(f"Erro de Inicialização (Base CSV): {e}")
         st.stop() # Para a execução do Streamlit se o CSV falhar
-    return None # Não deve chegar aqui
 
-@st.cache_resource(show_spinner="Inicializando Vetorstore...")
-def get_cached_retriever(_documents, _api_key):
-    """Inicializa o retriever usando a função do projeto_chatbot2.py e aplica cache."""
-    # Passamos os objetos para o cache (_documents, _api_key).
-    # O Streamlit os usará para determinar se precisa re-executar esta função.
     try:
-        return initialize_retriever(_documents, _api_key)
+        retriever = initialize_retriever(documents, _api_key)
     except Exception as e:
         st.error(f"Erro de Inicialização (Vetorstore): {e}")
         # Não paramos o app aqui, pois o bot ainda pode dar respostas gerais
-        return None # Retorna None para indicar que o retriever não foi inicializado
+        retriever = None # None indica que o retriever não foi inicializado
 
-@st.cache_resource(show_spinner="Inicializando Modelo Gemini...")
-def get_cached_chat_session(_api_key):
-    """Inicializa a sessão de chat Gemini usando a função do projeto_chatbot2.py e aplica cache."""
     try:
-        return initialize_gemini_chat(_api_key)
+        chat_session = initialize_gemini_chat(_api_key)
     except Exception as e:
         st.error(f"Erro de Inicialização (Modelo Gemini): {e}")
         st.stop() # Paramos o app aqui, pois o chat é essencial
-    return None # Não deve chegar aqui
+
+    return ChatResources(documents=documents, retriever=retriever, chat_session=chat_session)
 
 # --- Carregar os Recursos para a Sessão ---
 # Estas chamadas disparam as funções cacheadas acima.
 # Elas serão executadas rapidamente após a primeira vez.
 api_key = load_config() # Carrega a API Key
-documents = get_cached_documents() # Carrega os dados do CSV
-retriever = get_cached_retriever(documents, api_key) # Inicializa o retriever (passa os dados e a key)
-chat_session = get_cached_chat_session(api_key) # Inicializa o chat Gemini (passa a key)
+resources = get_resources(api_key) # Carrega o CSV, o retriever e o chat Gemini (passa a key)
+retriever = resources.retriever
+chat_session = resources.chat_session
 
 
 # --- Gerenciamento do Histórico do Chat (Streamlit Session State) ---
@@ -126,24 +127,36 @@ if chat_session:
     if prompt := st.chat_input("Digite sua pergunta aqui..."):
 
         # --- Processar a Pergunta do Usuário ---
-        # 1. Adiciona a pergunta do usuário ao histórico na session state
+        # 1. Guarda o histórico anterior (enviado ao modelo como contexto da conversa)
+        #    e adiciona a pergunta do usuário ao histórico na session state
+        history = list(st.session_state.messages)
         st.session_state.messages.append({"role": "user", "content": prompt})
         # 2. Exibe a pergunta do usuário imediatamente na interface
         with st.chat_message("user"):
             st.markdown(prompt)
 
-        # 3. Obtém a resposta do chatbot
+        # 3. Obtém e exibe a resposta do chatbot em streaming
         # Chama a função importada de projeto_chatbot2.py para obter a resposta.
-        # Passamos a pergunta do usuário e os recursos (retriever, chat_session)
-        # que foram carregados/cacheados anteriormente.
-        response_text = get_bot_response(prompt, retriever, chat_session)
-
-        # 4. Adiciona a resposta do assistente ao histórico na session state
-        st.session_state.messages.append({"role": "assistant", "content": response_text})
-
-        # 5. Exibe a resposta do assistente na interface
+        # Passamos a pergunta do usuário, os recursos (retriever, chat_session)
+        # que foram carregados/cacheados anteriormente e o histórico da conversa.
+        # st.write_stream exibe cada trecho assim que chega e devolve o texto completo.
         with st.chat_message("assistant"):
-            st.markdown(response_text)
+            response_text = st.write_stream(get_bot_response(prompt, retriever, chat_session, history))
+            if not response_text:
+                # O modelo não devolveu texto (ex.: resposta bloqueada pelos filtros de segurança)
+                response_text = "Não foi possível gerar uma resposta para esta pergunta. Tente reformulá-la."
+                st.markdown(response_text)
+                failed = True
+            else:
+                failed = is_error_response(response_text)
+
+        # 4. Adiciona a resposta do assistente ao histórico na session state.
+        # Respostas vazias ou de erro continuam visíveis, mas são marcadas com "error"
+        # para não serem reenviadas ao modelo como parte da conversa.
+        message = {"role": "assistant", "content": response_text}
+        if failed:
+            message["error"] = True
+        st.session_state.messages.append(message)
 
         # st.chat_input lida com a re-execução do script automaticamente após o envio.
         # A próxima execução exibirá todo o histórico atualizado devido ao loop acima.
@@ -1,14 +1,25 @@
 # projeto_chatbot2.py
 
 import os
+import csv
+import functools
+import pickle
+import hashlib
+import random
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import numpy as np
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
-from google.api_core import exceptions as google_exceptions
-from langchain_community.document_loaders import CSVLoader
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
+# Importações pesadas (faiss, SDKs do Google, google.api_core e integrações do LangChain) são feitas
+# dentro das funções que as usam, que rodam uma única vez sob @st.cache_resource.
+# Assim a interface do Streamlit é exibida sem esperar o registro de protobuf/grpc dessas bibliotecas.
 
 # --- Configuração de Arquivos ---
 # Obtém o diretório onde o script projeto_chatbot2.py está sendo executado.
@@ -17,6 +28,207 @@ from langchain_core.documents import Document
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CSV_FILE = os.path.join(SCRIPT_DIR, 'base_empresa.csv')
 ENV_FILE = os.path.join(SCRIPT_DIR, '.env')
+# Diretório onde o índice FAISS é salvo, evitando recalcular os embeddings a cada inicialização.
+FAISS_INDEX_DIR = os.path.join(SCRIPT_DIR, 'faiss_index')
+FAISS_HASH_FILE = os.path.join(FAISS_INDEX_DIR, 'csv.sha256')
+# Cache de embeddings por linha (chave: SHA-256 do modelo + conteúdo), para que edições no CSV
+# só gerem novas chamadas à API para as linhas alteradas.
+_EMBED_CACHE = os.path.join(SCRIPT_DIR, 'embed_cache.sqlite')
+
+# --- Configuração de Embeddings ---
+# Modelo usado para gerar os embeddings dos documentos e das perguntas.
+EMBEDDING_MODEL = "models/embedding-001"
+# Quantidade de textos enviados em cada chamada ao endpoint de embeddings em lote.
+EMBED_BATCH_SIZE = int(os.environ.get('EMBED_BATCH_SIZE', '64'))
+# Número máximo de lotes enviados simultaneamente à API de embeddings.
+EMBED_CONCURRENCY = int(os.environ.get('EMBED_CONCURRENCY', '4'))
+# Tentativas por lote quando a API responde com limite de requisições (HTTP 429).
+EMBED_MAX_RETRIES = 5
+
+# --- Configuração do Índice FAISS ---
+# Quantidade de documentos recuperados por pergunta (equilíbrio entre recall e latência).
+RETRIEVAL_K = int(os.environ.get('RETRIEVAL_K', '5'))
+
+# Abaixo desta quantidade de documentos, o FAISS é dispensado: a busca é feita por um único
+# produto matriz-vetor em numpy (BLAS), mais rápido e simples para bases pequenas.
+NUMPY_SEARCH_MAX_DOCS = 1000
+
+# Parâmetros do índice HNSW (busca aproximada), usado no lugar do índice plano padrão.
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+HNSW_EF_SEARCH = 32
+# Os vetores são armazenados quantizados em 8 bits (1 byte por dimensão em vez de 4),
+# reduzindo memória e a banda consumida em cada busca (nome do tipo em faiss.ScalarQuantizer).
+SCALAR_QUANTIZER_TYPE = 'QT_8bit'
+
+# --- Configuração do Chat ---
+# Quantidade de mensagens anteriores do histórico enviadas ao modelo a cada pergunta.
+HISTORY_TURNS = 4
+
+# Cache semântico de respostas: perguntas cujo embedding tem similaridade de cosseno
+# acima do limiar com uma pergunta já respondida reaproveitam a resposta anterior.
+SEMANTIC_CACHE_THRESHOLD = 0.97
+SEMANTIC_CACHE_MAX_ENTRIES = 512
+
+# Textos fixos enviados ao modelo. Ficam no nível do módulo para não serem remontados
+# a cada pergunta e para que o prefixo estático seja idêntico entre as chamadas
+# (o que permite ao provedor reaproveitar o cache desses tokens).
+_SYSTEM_INSTRUCTION = "Você é um assistente pessoal da empresa, especializado em fornecer informações com base nos dados que lhe são apresentados. Responda de forma clara, objetiva e amigável. Se a informação solicitada não estiver no contexto fornecido, diga educadamente que não possui essa informação. Caso não tenha informações na base, e através de pesquisas consiga montar uma resposta que não fuja muito da pergunta."
+
+# Mensagens de erro devolvidas no lugar da resposta; não devem voltar ao modelo como histórico.
+_ERRO_SESSAO = "Erro interno: A sessão do chat não foi inicializada corretamente."
+_ERRO_CHAT = "Ocorreu um erro durante a interação com o modelo de chat"
+
+_PROMPT_TEMPLATE = """
+Contexto de informações da base de dados:
+{context}
+
+---
+
+Pergunta do usuário: {question}
+
+---
+
+Com base no contexto fornecido acima (se houver) e na pergunta do usuário, responda de forma útil e concisa.
+- Se a resposta puder ser encontrada no contexto, use as informações fornecidas.
+- Se a resposta não estiver no contexto, mas você tiver conhecimento geral relevante, utilize-o para formar a resposta.
+- Se a resposta não estiver no contexto e você também não tiver conhecimento generalizado sobre o assunto, informe que a informação específica não foi encontrada na base de dados.
+Mantenha a persona de assistente pessoal da empresa.
+"""
+
+# Mensagens de conversa trivial (cumprimentos, agradecimentos), que não precisam de busca na base.
+_SMALLTALK = re.compile(r'^\s*(olá|oi|obrigad[oa]|tchau|bom dia|boa tarde|boa noite)[\s!.?]*$', re.IGNORECASE)
+
+# --- Estruturas de Dados ---
+
+class SemanticCache:
+    """
+    Cache de respostas indexado pelo embedding (normalizado) das perguntas.
+
+    Os vetores ficam em um buffer circular numpy: a busca é um único produto
+    matriz-vetor e, ao atingir max_entries, as entradas mais antigas são
+    substituídas (FIFO). É compartilhado entre as sessões, por isso usa um lock.
+
+    Como a chave é apenas a pergunta, só deve ser usado em perguntas sem histórico
+    de conversa (a resposta não pode depender de mensagens anteriores). A consulta
+    acontece após o embedding e a busca do contexto: um acerto economiza apenas a
+    chamada ao Gemini.
+    """
+
+    def __init__(self, max_entries=SEMANTIC_CACHE_MAX_ENTRIES, threshold=SEMANTIC_CACHE_THRESHOLD):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._vectors = None # Alocado na primeira inserção, quando a dimensão é conhecida
+        self._answers = [None] * max_entries
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector):
+        """Retorna a resposta da pergunta mais similar, se a similaridade passar do limiar."""
+        query = self._normalize(vector)
+        with self._lock:
+            if self._size == 0:
+                return None
+            scores = self._vectors[:self._size] @ query
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                return self._answers[best]
+        return None
+
+    def add(self, vector, answer):
+        """Armazena a resposta associada ao embedding da pergunta."""
+        query = self._normalize(vector)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, query.shape[0]), dtype=np.float32)
+            self._vectors[self._next] = query
+            self._answers[self._next] = answer
+            self._next = (self._next + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+
+@dataclass(eq=False)
+class Retriever:
+    """Agrupa o vetorstore FAISS e o modelo de embeddings usado nas consultas.
+
+    eq=False mantém o hash por identidade, permitindo usar a instância como chave do cache LRU.
+    """
+    vectorstore: object
+    embeddings: object
+    k: int = RETRIEVAL_K
+    answer_cache: SemanticCache = field(default_factory=SemanticCache)
+
+class NumpyVectorStore:
+    """
+    Vetorstore mínimo para bases pequenas: busca por similaridade de cosseno com numpy.
+
+    Implementa a mesma interface usada do FAISS (similarity_search_by_vector, save_local),
+    para que o restante do código não precise distinguir entre os dois.
+    """
+    VECTORS_FILE = 'vectors.npy'
+
+    def __init__(self, documents, vectors, normalized=False):
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.shape[0] != len(documents):
+            raise ValueError(f"Quantidade de vetores ({matrix.shape[0]}) diferente da de documentos ({len(documents)}).")
+        if not normalized:
+            # Normaliza as linhas uma única vez, para que a busca seja apenas um produto escalar
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1, norms)
+        self.documents = documents
+        self.matrix = matrix
+
+    def similarity_search_by_vector(self, embedding, k=5):
+        """Retorna os k documentos mais similares (cosseno) ao vetor informado."""
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = self.matrix @ query
+        k = min(k, len(self.documents))
+        # argpartition seleciona os k melhores sem ordenar toda a base; só eles são ordenados
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [self.documents[i] for i in top]
+
+    def save_local(self, folder_path):
+        """Salva a matriz de vetores normalizados em disco (os documentos vêm do CSV)."""
+        os.makedirs(folder_path, exist_ok=True)
+        path = os.path.join(folder_path, self.VECTORS_FILE)
+        # Grava em um arquivo temporário e o substitui atomicamente, para não alterar
+        # um arquivo que outros processos podem estar mapeando em memória
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, self.matrix)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_local(cls, folder_path, documents):
+        """Mapeia em memória (somente leitura) a matriz salva por save_local e a associa aos documentos."""
+        # mmap_mode='r' compartilha as páginas do arquivo entre os processos pelo cache do SO,
+        # em vez de cada worker manter sua própria cópia dos vetores
+        matrix = np.load(os.path.join(folder_path, cls.VECTORS_FILE), mmap_mode='r')
+        return cls(documents, matrix, normalized=True)
+
+@dataclass
+class ChatSession:
+    """Cliente Gemini e configuração usados para gerar as respostas, sem histórico no servidor."""
+    client: object
+    model: str
+    config: object
+
+@dataclass
+class ChatResources:
+    """Todos os recursos do chatbot, agrupados para serem cacheados juntos pela interface."""
+    documents: list
+    retriever: object
+    chat_session: object
 
 # --- Funções de Inicialização ---
 # Estas funções carregam os recursos necessários ou levantam exceções em caso de erro.
@@ -35,6 +247,18 @@ def load_api_key():
 
     return api_key
 
+def _format_csv_row(row):
+    """Formata uma linha do CSV como o CSVLoader: uma linha "coluna: valor" por campo."""
+    linhas = []
+    for coluna, valor in row.items():
+        if isinstance(valor, str):
+            valor = valor.strip()
+        elif isinstance(valor, list):
+            # Campos além do cabeçalho (ex.: ';' dentro de um texto não reconhecido como aspas)
+            valor = ",".join(v.strip() for v in valor)
+        linhas.append(f"{coluna.strip() if coluna is not None else coluna}: {valor}")
+    return "\n".join(linhas)
+
 def load_data():
     """Carrega dados do arquivo CSV em objetos Document."""
     documentos = []
@@ -42,12 +266,13 @@ def load_data():
          raise FileNotFoundError(f"ERRO: O arquivo CSV da base de dados não foi encontrado em {CSV_FILE}")
 
     try:
-        loader = CSVLoader(
-            file_path=CSV_FILE,
-            csv_args={'delimiter': ';'},
-            encoding='utf-8'
-        )
-        documentos = loader.load()
+        # Lê direto com o módulo csv (mesmas regras de parsing do CSVLoader, com campos extras
+        # agrupados na chave None), sem a camada de loaders do LangChain
+        with open(CSV_FILE, newline='', encoding='utf-8') as f:
+            documentos = [
+                Document(page_content=_format_csv_row(linha), metadata={'source': CSV_FILE, 'row': i})
+                for i, linha in enumerate(csv.DictReader(f, delimiter=';'))
+            ]
     except Exception as e:
         raise IOError(f"ERRO: Não foi possível ler ou processar o arquivo CSV '{CSV_FILE}'. Verifique o formato (delimitador ';'), codificação (UTF-8) e conteúdo. Detalhes: {e}")
 
@@ -57,32 +282,283 @@ def load_data():
 
     return documentos
 
+def _csv_hash():
+    """
+    Calcula o hash SHA-256 do modelo de embeddings + arquivo CSV, usado para validar o índice salvo.
+
+    O modelo entra no hash para que trocá-lo invalide o índice: vetores de outro modelo
+    (possivelmente de outra dimensão) fariam todas as buscas falharem.
+    """
+    with open(CSV_FILE, 'rb') as f:
+        return hashlib.sha256(EMBEDDING_MODEL.encode('utf-8') + b'\n' + f.read()).hexdigest()
+
+def _stored_csv_hash():
+    """Lê o hash do CSV gravado junto ao índice FAISS (ou None se não existir)."""
+    if not os.path.exists(FAISS_HASH_FILE):
+        return None
+    with open(FAISS_HASH_FILE, 'r', encoding='utf-8') as f:
+        return f.read().strip()
+
+def _faiss_store_kwargs():
+    """
+    Parâmetros do wrapper FAISS do LangChain para similaridade de cosseno.
+
+    Vetores normalizados (L2) comparados por produto interno, evitando a subtração por
+    elemento da distância L2. Os documentos são normalizados em _build_vectorstore e as
+    consultas em _retrieve_context (o wrapper não suporta normalize_L2 com produto interno).
+    """
+    from langchain_community.vectorstores.utils import DistanceStrategy
+    return {'distance_strategy': DistanceStrategy.MAX_INNER_PRODUCT}
+
+def _load_faiss_index(embeddings):
+    """
+    Carrega o índice FAISS salvo por save_local, mapeando o arquivo em memória.
+
+    Equivale a FAISS.load_local, mas lê o index.faiss com IO_FLAG_MMAP_IFC, de modo que
+    processos diferentes compartilhem as páginas do índice pelo cache do SO.
+    (IO_FLAG_MMAP mapeia apenas as listas invertidas de índices IVF; para o HNSW+SQ
+    usado aqui, ele leria o arquivo inteiro para a RAM.)
+    """
+    import faiss
+    from langchain_community.vectorstores import FAISS
+
+    index_path = os.path.join(FAISS_INDEX_DIR, 'index.faiss')
+    try:
+        index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC)
+    except RuntimeError:
+        # Nem todo tipo de índice suporta mmap; nesse caso, lê normalmente para a RAM
+        index = faiss.read_index(index_path)
+
+    # O docstore e o mapeamento de ids são salvos pelo LangChain em index.pkl
+    with open(os.path.join(FAISS_INDEX_DIR, 'index.pkl'), 'rb') as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+        **_faiss_store_kwargs(),
+    )
+
+def _save_index(vectorstore, csv_hash):
+    """Salva o índice em disco junto com o hash do CSV que o originou."""
+    try:
+        os.makedirs(FAISS_INDEX_DIR, exist_ok=True)
+        if isinstance(vectorstore, NumpyVectorStore):
+            # NumpyVectorStore.save_local já grava em arquivo temporário e substitui atomicamente
+            vectorstore.save_local(FAISS_INDEX_DIR)
+        else:
+            # save_local reescreve index.faiss no lugar; outros workers podem estar com ele mapeado
+            # em memória, então grava em um diretório temporário e move os arquivos prontos
+            tmp_dir = tempfile.mkdtemp(dir=FAISS_INDEX_DIR)
+            try:
+                vectorstore.save_local(tmp_dir)
+                for name in ('index.faiss', 'index.pkl'):
+                    os.replace(os.path.join(tmp_dir, name), os.path.join(FAISS_INDEX_DIR, name))
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+        tmp_hash = FAISS_HASH_FILE + '.tmp'
+        with open(tmp_hash, 'w', encoding='utf-8') as f:
+            f.write(csv_hash)
+        os.replace(tmp_hash, FAISS_HASH_FILE)
+    except Exception as e:
+        # Falhar ao salvar não impede o uso do índice em memória
+        print(f"AVISO (projeto_chatbot2.py): Não foi possível salvar o índice em '{FAISS_INDEX_DIR}'. Detalhes: {e}")
+
+def _is_rate_limit_error(error):
+    """Indica se o erro corresponde a um limite de requisições (HTTP 429) da API."""
+    from google.api_core import exceptions as google_exceptions
+
+    if isinstance(error, google_exceptions.ResourceExhausted):
+        return True
+    message = str(error)
+    return '429' in message or 'RESOURCE_EXHAUSTED' in message
+
+def _embed_with_retry(embeddings, batch):
+    """Gera os embeddings de um lote, repetindo com backoff aleatório em caso de HTTP 429."""
+    for attempt in range(EMBED_MAX_RETRIES):
+        try:
+            return embeddings.embed_documents(batch)
+        except Exception as e:
+            if not _is_rate_limit_error(e) or attempt == EMBED_MAX_RETRIES - 1:
+                raise
+            # Backoff exponencial com jitter, para que os lotes paralelos não tentem todos ao mesmo tempo
+            time.sleep(random.uniform(0, 2 ** attempt))
+
+def _request_embeddings(texts, embeddings):
+    """Gera os embeddings dos textos pela API, em lotes paralelos, preservando a ordem de entrada."""
+    # Divide os textos em lotes de EMBED_BATCH_SIZE, em vez de uma requisição por documento
+    batches = [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+
+    def embed_batch(batch):
+        return _embed_with_retry(embeddings, batch)
+
+    # Os lotes são independentes, então são enviados em paralelo.
+    # executor.map preserva a ordem de entrada, mantendo textos e vetores alinhados.
+    vectors = []
+    with ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as executor:
+        for batch_vectors in executor.map(embed_batch, batches):
+            vectors.extend(batch_vectors)
+    return vectors
+
+def _load_cached_embeddings(conn, keys):
+    """Busca no cache os vetores já calculados para as chaves informadas."""
+    cached = {}
+    # Consulta em blocos para respeitar o limite de parâmetros por instrução do SQLite
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        placeholders = ','.join('?' * len(chunk))
+        rows = conn.execute(f"SELECT sha256, vec FROM embeddings WHERE sha256 IN ({placeholders})", chunk)
+        for key, blob in rows:
+            cached[key] = np.frombuffer(blob, dtype=np.float16).astype(np.float32).tolist()
+    return cached
+
+def _embed_texts(texts, embeddings):
+    """
+    Gera os embeddings dos textos, reaproveitando os já calculados no cache SQLite.
+
+    Apenas os textos ausentes do cache são enviados à API; os novos vetores são
+    gravados de volta (em float16, metade do espaço em disco).
+    """
+    # A chave inclui o modelo de embeddings: trocar de modelo não reaproveita vetores
+    # (de outra dimensão ou espaço) calculados pelo modelo anterior
+    model = getattr(embeddings, 'model', '')
+    keys = [hashlib.sha256(f"{model}\n{t}".encode('utf-8')).hexdigest() for t in texts]
+
+    conn = None
+    try:
+        conn = sqlite3.connect(_EMBED_CACHE)
+        conn.execute("CREATE TABLE IF NOT EXISTS embeddings (sha256 TEXT PRIMARY KEY, vec BLOB)")
+        cached = _load_cached_embeddings(conn, list(set(keys)))
+    except sqlite3.Error as e:
+        # Sem cache, todos os textos são enviados à API
+        print(f"AVISO (projeto_chatbot2.py): Não foi possível ler o cache de embeddings '{_EMBED_CACHE}'. Detalhes: {e}")
+        cached = {}
+
+    try:
+        # Textos repetidos no CSV são enviados uma única vez
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+
+        if missing:
+            new_vectors = _request_embeddings(list(missing.values()), embeddings)
+            new_items = dict(zip(missing.keys(), new_vectors))
+            cached.update(new_items)
+            try:
+                if conn is not None:
+                    with conn:
+                        conn.executemany(
+                            "INSERT OR REPLACE INTO embeddings (sha256, vec) VALUES (?, ?)",
+                            [(key, np.asarray(vec, dtype=np.float16).tobytes()) for key, vec in new_items.items()],
+                        )
+            except sqlite3.Error as e:
+                # Falhar ao gravar o cache não impede o uso dos vetores recém-gerados
+                print(f"AVISO (projeto_chatbot2.py): Não foi possível gravar o cache de embeddings '{_EMBED_CACHE}'. Detalhes: {e}")
+
+        # Monta os vetores na mesma ordem dos textos de entrada
+        return [cached[key] for key in keys]
+    finally:
+        if conn is not None:
+            conn.close()
+
+def _use_numpy_search(documents):
+    """Indica se a base é pequena o suficiente para dispensar o FAISS."""
+    return len(documents) < NUMPY_SEARCH_MAX_DOCS
+
+def _build_vectorstore(documents, embeddings):
+    """Gera os embeddings em lotes e constrói o vetorstore (numpy ou FAISS) a partir deles."""
+    vectors = _embed_texts([doc.page_content for doc in documents], embeddings)
+
+    if _use_numpy_search(documents):
+        return NumpyVectorStore(documents, vectors)
+
+    import faiss
+    from langchain_community.vectorstores import FAISS
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+
+    # Índice HNSW: busca aproximada em grafo, em vez da varredura completa de um índice plano.
+    # O FAISS exige float32 na inserção; a quantização em 8 bits é feita pelo próprio índice.
+    vectors_f32 = np.asarray(vectors, dtype=np.float32)
+    faiss.normalize_L2(vectors_f32)
+    dimension = vectors_f32.shape[1]
+    index = faiss.IndexHNSWSQ(dimension, getattr(faiss.ScalarQuantizer, SCALAR_QUANTIZER_TYPE), HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    # O treino do quantizador apenas calcula os intervalos de cada dimensão
+    index.train(vectors_f32)
+    index.add(vectors_f32)
+
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore({str(i): doc for i, doc in enumerate(documents)}),
+        index_to_docstore_id={i: str(i) for i in range(len(documents))},
+        **_faiss_store_kwargs(),
+    )
+
 def initialize_retriever(documents, api_key):
-    """Inicializa embeddings e constrói o vetorstore retriever."""
+    """Inicializa embeddings e constrói o retriever (vetorstore + embeddings)."""
     if not documents:
          # Se não há documentos, não inicializa o retriever e retorna None
          print("AVISO (projeto_chatbot2.py): Não há documentos para criar o vetorstore.")
          return None # Retorna None para indicar que o retriever não pôde ser criado
 
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
     try:
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=api_key)
-        vectorstore = FAISS.from_documents(documents, embeddings)
-        retriever = vectorstore.as_retriever(search_kwargs={"k": 5})
-        return retriever
+        embeddings = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, google_api_key=api_key)
+        csv_hash = _csv_hash()
+
+        vectorstore = None
+        if _stored_csv_hash() == csv_hash:
+            try:
+                # O CSV não mudou desde a última execução: reaproveita o índice salvo em disco
+                if _use_numpy_search(documents):
+                    vectorstore = NumpyVectorStore.load_local(FAISS_INDEX_DIR, documents)
+                else:
+                    import faiss
+                    vectorstore = _load_faiss_index(embeddings)
+                    # Índices salvos antes da troca para cosseno usam L2 e precisam ser recriados
+                    if vectorstore.index.metric_type != faiss.METRIC_INNER_PRODUCT:
+                        vectorstore = None
+                        raise ValueError("o índice salvo não usa produto interno.")
+            except Exception as e:
+                print(f"AVISO (projeto_chatbot2.py): Não foi possível carregar o índice salvo, ele será recriado. Detalhes: {e}")
+
+        if vectorstore is None:
+            vectorstore = _build_vectorstore(documents, embeddings)
+            _save_index(vectorstore, csv_hash)
+
+        # Define o efSearch das consultas tanto para índices recém-construídos quanto carregados
+        # (índices salvos antes da adoção do HNSW não possuem o atributo hnsw)
+        if hasattr(getattr(vectorstore, 'index', None), 'hnsw'):
+            vectorstore.index.hnsw.efSearch = HNSW_EF_SEARCH
+
+        # Com menos documentos que RETRIEVAL_K na base, não há por que pedir mais do que existe
+        k = min(RETRIEVAL_K, len(documents))
+        return Retriever(vectorstore=vectorstore, embeddings=embeddings, k=k)
     except Exception as e:
          raise RuntimeError(f"ERRO: Não foi possível inicializar embeddings ou vetorstore. Detalhes: {e}")
 
 
 def initialize_gemini_chat(api_key):
     """Inicializa a sessão de chat com o modelo Gemini."""
+    from google import genai
+    from google.genai import types
+    from google.api_core import exceptions as google_exceptions
+
     tipo = 'gemini-1.5-flash'
     chat_config = types.GenerateContentConfig(
-        system_instruction= "Você é um assistente pessoal da empresa, especializado em fornecer informações com base nos dados que lhe são apresentados. Responda de forma clara, objetiva e amigável. Se a informação solicitada não estiver no contexto fornecido, diga educadamente que não possui essa informação. Caso não tenha informações na base, e através de pesquisas consiga montar uma resposta que não fuja muito da pergunta."
+        system_instruction=_SYSTEM_INSTRUCTION
     )
     try:
         client = genai.Client(api_key=api_key)
-        chat = client.chats.create(model=tipo, config=chat_config)
-        return chat
+        # Não usa client.chats.create: o histórico completo seria reenviado a cada mensagem.
+        # O histórico recente é montado por get_bot_response (ver HISTORY_TURNS).
+        return ChatSession(client=client, model=tipo, config=chat_config)
     except google_exceptions.GoogleAPIError as e:
         raise ConnectionError(f"ERRO de API do Google: Não foi possível conectar ou inicializar o modelo Gemini '{tipo}'. Verifique sua API key, conexão e disponibilidade do modelo. Detalhes: {e}")
     except Exception as e:
@@ -90,59 +566,153 @@ def initialize_gemini_chat(api_key):
 
 # --- Função Principal de Resposta do Chatbot ---
 
-def get_bot_response(question, retriever, chat_session):
+class _QuestionKey:
+    """Chave do cache LRU: compara pela pergunta normalizada, mas guarda o texto original."""
+    __slots__ = ('text', 'normalized')
+
+    def __init__(self, text):
+        self.text = text
+        self.normalized = text.strip().lower()
+
+    def __hash__(self):
+        return hash(self.normalized)
+
+    def __eq__(self, other):
+        return isinstance(other, _QuestionKey) and self.normalized == other.normalized
+
+def _retrieve_context(retriever, question):
+    """
+    Busca e formata o contexto da base de dados para a pergunta.
+
+    O cache é indexado pela pergunta normalizada (caixa e espaços), para que variações
+    reaproveitem o resultado, mas o embedding é gerado a partir do texto original.
+
+    Returns:
+        tuple: (vetor da pergunta, contexto formatado)
+    """
+    return _retrieve_context_cached(retriever, _QuestionKey(question))
+
+@functools.lru_cache(maxsize=512)
+def _retrieve_context_cached(retriever, key):
+    """
+    Implementação de _retrieve_context, com o resultado em cache (LRU).
+
+    Perguntas repetidas não geram novas chamadas de embedding nem buscas no FAISS.
+    São armazenados apenas o vetor da pergunta (usado pelo cache semântico de
+    respostas) e a string formatada, para limitar o uso de memória.
+    """
+    # Gera o embedding da pergunta pelo endpoint de texto único (sem o overhead do lote)
+    vetor_pergunta = np.asarray(retriever.embeddings.embed_query(key.text), dtype=np.float32)
+    # Normaliza o vetor: a busca por produto interno nos vetores normalizados equivale ao cosseno
+    norma = np.linalg.norm(vetor_pergunta)
+    if norma:
+        vetor_pergunta /= norma
+    # Com o vetor da pergunta, o vetorstore busca documentos relevantes
+    documentos_relevantes: list[Document] = retriever.vectorstore.similarity_search_by_vector(vetor_pergunta.tolist(), k=retriever.k)
+    # Formata o texto dos documentos relevantes para o prompt do modelo
+    return vetor_pergunta, "\n---\n".join(doc.page_content for doc in documentos_relevantes)
+
+def is_error_response(text):
+    """Indica se o texto devolvido por get_bot_response é (ou termina em) uma mensagem de erro."""
+    return text.startswith(_ERRO_SESSAO) or _ERRO_CHAT in text
+
+def _recent_history(history):
+    """Retorna as últimas HISTORY_TURNS mensagens do histórico que serão enviadas ao modelo."""
+    # Mensagens vazias (ex.: resposta bloqueada) ou marcadas como erro não são enviadas:
+    # uma Part sem texto faz as próximas chamadas ao Gemini falharem
+    validas = [
+        message for message in history
+        if not message.get("error") and message["content"].strip()
+    ]
+    recentes = validas[-HISTORY_TURNS:] if HISTORY_TURNS > 0 else []
+    # A conversa enviada ao modelo deve começar por uma mensagem do usuário
+    while recentes and recentes[0]["role"] != "user":
+        recentes.pop(0)
+    return recentes
+
+def _build_contents(history, prompt_final):
+    """Monta a lista de conteúdos enviada ao modelo: as últimas mensagens do histórico e o prompt atual."""
+    from google.genai import types
+
+    contents = [
+        types.Content(
+            role="user" if message["role"] == "user" else "model",
+            parts=[types.Part(text=message["content"])],
+        )
+        for message in _recent_history(history)
+    ]
+    contents.append(types.Content(role="user", parts=[types.Part(text=prompt_final)]))
+    return contents
+
+def get_bot_response(question, retriever, chat_session, history=()):
     """
-    Obtém a resposta do modelo Gemini com base na pergunta e contexto.
+    Obtém a resposta do modelo Gemini com base na pergunta e contexto, em streaming.
 
     Args:
         question (str): A pergunta do usuário.
-        retriever: O objeto retriever da base de dados (ou None).
-        chat_session: A sessão de chat do Gemini (ou None).
+        retriever (Retriever): O vetorstore e os embeddings da base de dados (ou None).
+        chat_session (ChatSession): O cliente e a configuração do Gemini (ou None).
+        history (list[dict]): Mensagens anteriores da conversa ({"role", "content"}),
+            sem incluir a pergunta atual. Apenas as últimas HISTORY_TURNS são enviadas.
 
-    Returns:
-        str: A resposta do chatbot ou uma mensagem de erro.
+    Yields:
+        str: Trechos da resposta do chatbot, à medida que são gerados, ou uma mensagem de erro.
     """
     if not chat_session:
          # Retorna uma mensagem de erro se a sessão de chat não foi inicializada
-         return "Erro interno: A sessão do chat não foi inicializada corretamente."
+         yield _ERRO_SESSAO
+         return
 
     contexto_formatado = ""
-    if retriever: # Verifica se o retriever foi inicializado com sucesso
+    vetor_pergunta = None
+    # Verifica se o retriever foi inicializado com sucesso.
+    # Cumprimentos e agradecimentos não precisam de contexto: evita o embedding e a busca no FAISS.
+    if retriever and not _SMALLTALK.match(question):
         try:
-            # Com a pergunta do usuário, o retriever busca documentos relevantes
-            documentos_relevantes: list[Document] = retriever.invoke(question)
-            # Formata o texto dos documentos relevantes para o prompt do modelo
-            contexto_formatado = "\n---\n".join([doc.page_content for doc in documentos_relevantes])
+            vetor_pergunta, contexto_formatado = _retrieve_context(retriever, question)
         except Exception as e:
              # Loga o erro, mas permite que a resposta do Gemini prossiga (sem contexto do CSV)
              print(f"AVISO (projeto_chatbot2.py): Ocorreu um erro ao buscar documentos relevantes: {e}")
              contexto_formatado = "Não foi possível buscar contexto na base de dados devido a um erro."
 
-    # Define o prompt final que será enviado ao modelo Gemini, incluindo o contexto (se houver).
-    prompt_final = f"""
-    Contexto de informações da base de dados:
-    {contexto_formatado if contexto_formatado else "Nenhum contexto da base de dados encontrado."}
+    # O cache semântico é compartilhado entre as sessões e ignora o histórico, então só é
+    # usado quando nenhuma mensagem anterior é enviada ao modelo junto com a pergunta
+    usa_cache_respostas = vetor_pergunta is not None and not _recent_history(history)
 
-    ---
+    if usa_cache_respostas:
+        # Pergunta praticamente igual a uma já respondida: reaproveita a resposta sem chamar o Gemini
+        resposta_cacheada = retriever.answer_cache.lookup(vetor_pergunta)
+        if resposta_cacheada is not None:
+            yield resposta_cacheada
+            return
 
-    Pergunta do usuário: {question}
-
-    ---
-
-    Com base no contexto fornecido acima (se houver) e na pergunta do usuário, responda de forma útil e concisa.
-    - Se a resposta puder ser encontrada no contexto, use as informações fornecidas.
-    - Se a resposta não estiver no contexto, mas você tiver conhecimento geral relevante, utilize-o para formar a resposta.
-    - Se a resposta não estiver no contexto e você também não tiver conhecimento generalizado sobre o assunto, informe que a informação específica não foi encontrada na base de dados.
-    Mantenha a persona de assistente pessoal da empresa.
-    """
+    # Define o prompt final que será enviado ao modelo Gemini, incluindo o contexto (se houver).
+    prompt_final = _PROMPT_TEMPLATE.format(
+        context=contexto_formatado if contexto_formatado else "Nenhum contexto da base de dados encontrado.",
+        question=question,
+    )
 
     try:
-        # Envia o prompt para o modelo e obtém a resposta
-        resposta = chat_session.send_message(prompt_final)
-        return resposta.text # Retorna apenas o texto da resposta
+        # Envia o prompt para o modelo e repassa cada trecho assim que ele chega,
+        # para que o usuário veja a resposta começar sem esperar a geração completa
+        stream = chat_session.client.models.generate_content_stream(
+            model=chat_session.model,
+            contents=_build_contents(history, prompt_final),
+            config=chat_session.config,
+        )
+        trechos = []
+        for chunk in stream:
+            if chunk.text:
+                trechos.append(chunk.text)
+                yield chunk.text
     except Exception as e:
         # Retorna a mensagem de erro para ser exibida na interface do usuário
-        return f"Ocorreu um erro durante a interação com o modelo de chat: {e}"
+        # (respostas com erro não são guardadas no cache semântico)
+        yield f"{_ERRO_CHAT}: {e}"
+        return
+
+    if usa_cache_respostas and trechos:
+        retriever.answer_cache.add(vetor_pergunta, "".join(trechos))
 
 # Este arquivo não tem um bloco if __name__ == "__main__":
 # porque ele não é feito para ser executado diretamente, apenas importado.
\ No newline at end of file